@@ -0,0 +1 @@
+from brfundamentus.cli.radar import main
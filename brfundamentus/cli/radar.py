@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+
+import pandas as pd
+
+from brfundamentus.src import StockInfo
+
+"""
+Command line runner for screens (radars).
+It loads a single snapshot of the stocks info and evaluates all the screens in parallel.
+
+Each screen definition file (JSON or YAML) contains a screen, or a list of screens,
+in the format of the method StockInfo.get_top_stocks_by_conditions:
+
+    {
+        "name": "graham",
+        "conditionals": [{"parameter": "DESCONTO (GRAHAM)", "cut_criterion": 0.3, "reverse_cut": false}],
+        "sort_by": {"parameter": "DESCONTO (GRAHAM)", "ascending": false},
+        "num_stocks": 50,
+        "disconsider": [],
+        "only_from": []
+    }
+"""
+
+OUTPUT_FORMATS = ("csv", "json")
+
+_stock_info: Optional[StockInfo] = None
+
+
+def load_snapshot(cache_path: Optional[str] = None, max_age_hours: float = 24) -> StockInfo:
+    """
+    Loads the snapshot from 'cache_path' if it is fresh enough and compatible with this version.
+    Otherwise, builds a new one from the server and saves it on 'cache_path'.
+    """
+
+    if cache_path is not None and os.path.exists(cache_path):
+        try:
+            stock_info = StockInfo.load(cache_path)
+        except Exception as error:
+            print(f"Ignoring cached snapshot {cache_path}: {error}", file=sys.stderr)
+        else:
+            if datetime.now() - stock_info.request_time <= timedelta(hours=max_age_hours):
+                return stock_info
+
+    stock_info = StockInfo()
+
+    if cache_path is not None:
+        stock_info.save(cache_path)
+
+    return stock_info
+
+
+def read_screens(path: str) -> List[Dict]:
+    """
+    Reads the screen definitions from a JSON or YAML file.
+    Screens without a name are named after the file.
+    """
+
+    with open(path, "r") as file:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML is required to read YAML screen files")
+            content = yaml.safe_load(file)
+        else:
+            content = json.load(file)
+
+    screens = content if isinstance(content, list) else [content]
+
+    file_name = os.path.splitext(os.path.basename(path))[0]
+    for i, screen in enumerate(screens):
+        if "conditionals" not in screen or "sort_by" not in screen:
+            raise ValueError(f"Screen {i} of {path} must have the keys 'conditionals' and 'sort_by'")
+        if "name" not in screen:
+            screen["name"] = file_name if len(screens) == 1 else f"{file_name}_{i}"
+
+    return screens
+
+
+def _init_worker(stock_info: StockInfo):
+    global _stock_info
+    _stock_info = stock_info
+
+
+def _run_screen(screen: Dict):
+    start = time.perf_counter()
+    try:
+        result = _stock_info.get_top_stocks_by_conditions(conditionals=screen["conditionals"],
+                                                          sort_by=screen["sort_by"],
+                                                          num_stocks=screen.get("num_stocks", 50),
+                                                          disconsider=screen.get("disconsider"),
+                                                          only_from=screen.get("only_from"))
+        error = None
+    except Exception as exception:
+        result = None
+        error = f"{type(exception).__name__}: {exception}"
+    elapsed = time.perf_counter() - start
+
+    return screen["name"], result, elapsed, error
+
+
+def run_screens(stock_info: StockInfo, screens: List[Dict], workers: Optional[int] = None) -> List[tuple]:
+    """
+    Evaluates all screens in parallel over the same snapshot.
+    Returns a list of tuples (name, result, elapsed seconds, error), in the same order of 'screens'.
+    For the screens that failed, result is None and error is the description of the exception.
+    """
+
+    if workers == 1:
+        _init_worker(stock_info)
+        return [_run_screen(screen) for screen in screens]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(stock_info,)) as executor:
+        return list(executor.map(_run_screen, screens))
+
+
+def write_result(name: str, result: List[Dict], output_dir: str, output_format: str) -> str:
+    path = os.path.join(output_dir, f"{name}.{output_format}")
+
+    if output_format == "csv":
+        pd.DataFrame(result).to_csv(path, index=False)
+    else:
+        with open(path, "w") as file:
+            json.dump(result, file, indent=2)
+
+    return path
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Evaluate screens over a single snapshot of brazilian stocks")
+    parser.add_argument("screens", nargs="+", help="JSON or YAML files with screen definitions")
+    parser.add_argument("--cache", default=None, help="Path of the snapshot cache file")
+    parser.add_argument("--max-age", type=float, default=24,
+                        help="Maximum age, in hours, of the cached snapshot. Default value is 24")
+    parser.add_argument("--output-dir", default=".", help="Directory where results are written")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv", help="Output format")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of parallel workers. Default is the number of cores")
+    args = parser.parse_args(argv)
+
+    screens = []
+    for path in args.screens:
+        screens += read_screens(path)
+
+    names = [screen["name"] for screen in screens]
+    duplicated = {name for name in names if names.count(name) > 1}
+    if duplicated:
+        parser.error(f"Duplicated screen names: {', '.join(sorted(duplicated))}")
+
+    start = time.perf_counter()
+    stock_info = load_snapshot(cache_path=args.cache, max_age_hours=args.max_age)
+    load_time = time.perf_counter() - start
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    results = run_screens(stock_info=stock_info, screens=screens, workers=args.workers)
+
+    print(f"Snapshot from {stock_info.request_time:%Y-%m-%d %H:%M:%S} loaded in {load_time:.3f}s")
+    print("-" * 50)
+    failed = 0
+    for name, result, elapsed, error in results:
+        if error is not None:
+            failed += 1
+            print(f"{name} | FAILED | {elapsed:.4f}s | {error}")
+            continue
+        path = write_result(name=name, result=result, output_dir=args.output_dir, output_format=args.format)
+        print(f"{name} | {len(result)} stocks | {elapsed:.4f}s | {path}")
+    print("-" * 50)
+
+    if failed:
+        print(f"{failed} of {len(results)} screens failed", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
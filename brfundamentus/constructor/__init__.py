@@ -1,2 +1,3 @@
 from brfundamentus.constructor.request_builder import ResquestBuilder
 from brfundamentus.constructor.builder import StockInfoConstructor
+from brfundamentus.constructor.chunked_builder import ChunkedStockInfoConstructor
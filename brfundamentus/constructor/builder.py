@@ -1,6 +1,7 @@
 import pandas as pd
+import numpy as np
 import math
-import requests
+import os
 from typing import Optional
 from brfundamentus.constructor import ResquestBuilder
 
@@ -9,7 +10,9 @@ class StockInfoConstructor:
     MARKET_RISK = 0.15
     MAX_PL = 40
     MIN_LIQUIDITY = 0.19
-    BANKS_PATH = "https://raw.githubusercontent.com/renanmath/br_stocks_fundamentus/main/brfundamentus/data/bancos_e_seguradoras.txt"
+    COMPANY_PREFIX_LENGTH = 4
+    DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+    EXCLUSION_FILES = ["bancos_e_seguradoras.txt"]
 
     """
     Class responsible to construct the dataframe with all the infomation of fundamentalist indicators
@@ -18,7 +21,7 @@ class StockInfoConstructor:
 
     def __init__(self) -> None:
 
-        self.__banks_tickers = self.__get_banks_tickers()
+        self.__excluded_companies = self.load_excluded_companies()
 
         self.__request_builder = ResquestBuilder()
 
@@ -32,6 +35,10 @@ class StockInfoConstructor:
 
         self.__dict_info: Optional[dict] = None
 
+        self.__company_index: Optional[dict] = None
+
+        self.__ticker_company: Optional[dict] = None
+
     @property
     def stocks_table(self):
         return self.__stocks_table
@@ -57,6 +64,43 @@ class StockInfoConstructor:
     def request_time(self):
         return self.__request_builder.request_time
 
+    @property
+    def excluded_companies(self):
+        return self.__excluded_companies
+
+    @property
+    def company_index(self) -> dict:
+        """
+        Dictionary whose keys are the companies (ticker prefixes) and values are the list of tickers of each company
+        """
+        self.__build_company_index()
+        return self.__company_index
+
+    @property
+    def ticker_company(self) -> dict:
+        """
+        Dictionary whose keys are the tickers and values are their companies (ticker prefixes)
+        """
+        self.__build_company_index()
+        return self.__ticker_company
+
+    @classmethod
+    def company_of(cls, tickers):
+        """
+        Returns the company (ticker prefix) of a ticker, or of each ticker of a pandas Index
+        """
+        if isinstance(tickers, str):
+            return tickers[:cls.COMPANY_PREFIX_LENGTH]
+        return tickers.str[:cls.COMPANY_PREFIX_LENGTH]
+
+    def __build_company_index(self):
+        if self.__company_index is None:
+            companies = self.company_of(self.__stocks_table.index)
+            self.__company_index = {company: tickers.tolist()
+                                    for company, tickers in self.__stocks_table.index.groupby(companies).items()}
+            self.__ticker_company = {ticker: company for company, tickers in self.__company_index.items()
+                                     for ticker in tickers}
+
     def __build_initial_dataframe(self):
         """
         This methods initializes the initial dataframe with the information of stocks
@@ -64,34 +108,41 @@ class StockInfoConstructor:
 
         original_data = self.__request_builder.data
 
-        treated_data = self.__treat_original_data(original_data=original_data)
+        treated_data = self.treat_original_data(original_data=original_data)
 
         return treated_data
 
     def __build_filtered_dataframe(self) -> pd.DataFrame:
 
-        copy_data = self.__stocks_table.copy(deep=True)
+        mask = self.filtered_mask(data=self.__stocks_table, excluded_companies=self.__excluded_companies)
 
-        banks_index = [t for t in copy_data.index if t[:4] in self.__banks_tickers]
+        return self.__stocks_table[mask].copy(deep=True)
 
-        copy_data.drop(banks_index, inplace=True)
-
-        copy_data.drop(copy_data[copy_data['P/L'] >
-                                 self.MAX_PL].index, inplace=True)
-        copy_data.drop(copy_data[copy_data['LIQUIDEZ MEDIA DIARIA']
-                                 < self.MIN_LIQUIDITY].index, inplace=True)
-        copy_data.drop(copy_data[copy_data['EV/EBIT']
-                                 <= 0].index, inplace=True)
+    @classmethod
+    def filtered_mask(cls, data: pd.DataFrame, excluded_companies: set) -> pd.Series:
+        """
+        Returns a boolean mask of the stocks that belong to the filtered table
+        """
+        excluded = cls.company_of(data.index).isin(excluded_companies)
 
-        return copy_data
+        return (~excluded & ~(data['P/L'] > cls.MAX_PL)
+                & ~(data['LIQUIDEZ MEDIA DIARIA'] < cls.MIN_LIQUIDITY)
+                & ~(data['EV/EBIT'] <= 0))
 
-    def __get_banks_tickers(self):
-        response = requests.get(self.BANKS_PATH)
-        lines = response.text.split("\n")
+    @classmethod
+    def load_excluded_companies(cls) -> set:
+        """
+        Reads the bundled lists of companies (ticker prefixes) excluded from the filtered table
+        """
+        companies = set()
+        for file_name in cls.EXCLUSION_FILES:
+            with open(os.path.join(cls.DATA_DIR, file_name), "r") as file:
+                companies.update(line.strip() for line in file if line.strip())
 
-        return lines
+        return companies
 
-    def __treat_original_data(self, original_data: pd.DataFrame):
+    @classmethod
+    def treat_original_data(cls, original_data: pd.DataFrame):
         """
         This method treat and clean the original data coming from statusinvest
         """
@@ -111,12 +162,13 @@ class StockInfoConstructor:
         original_data.drop(
             original_data[original_data['LIQUIDEZ MEDIA DIARIA'].isnull()].index, inplace=True)
 
-        stocks_data = self.__create_missing_fundamentalist_indicators(
+        stocks_data = cls.__create_missing_fundamentalist_indicators(
             data=original_data)
 
         return stocks_data
 
-    def __create_missing_fundamentalist_indicators(self, data: pd.DataFrame):
+    @classmethod
+    def __create_missing_fundamentalist_indicators(cls, data: pd.DataFrame):
         """
         This method creates and insert the missing fundamentalist indicators
         """
@@ -124,8 +176,8 @@ class StockInfoConstructor:
         data['DPA'] = (data['DY'] * data['PRECO'])
         data['PAYOUT'] = data['DPA'] / data['LPA']
 
-        data['CRESCIMENTO ESPERADO'] = self.__build_expected_growth(data=data)
-        data['CRESCIMENTO MEDIO'] = self.__build_mean_projected_growth(
+        data['CRESCIMENTO ESPERADO'] = cls.__build_expected_growth(data=data)
+        data['CRESCIMENTO MEDIO'] = cls.__build_mean_projected_growth(
             data=data)
 
         data['PEG'] = data['P/L'] / data['CRESCIMENTO MEDIO']
@@ -135,7 +187,8 @@ class StockInfoConstructor:
 
         return data
 
-    def __build_expected_growth(self, data: pd.DataFrame) -> list:
+    @staticmethod
+    def __build_expected_growth(data: pd.DataFrame) -> list:
         """
         This method construc the expected growth based on past growth.
         """
@@ -148,7 +201,8 @@ class StockInfoConstructor:
 
         return expected_growth
 
-    def __build_mean_projected_growth(self, data: pd.DataFrame) -> list:
+    @staticmethod
+    def __build_mean_projected_growth(data: pd.DataFrame) -> list:
         """
         This method calculates the expected growth for the future, based on the past growth.
         """
@@ -164,54 +218,59 @@ class StockInfoConstructor:
 
         return projected_growth
 
-    def build_graham_fair_price(self, data: pd.DataFrame) -> list:
+    @staticmethod
+    def build_graham_fair_price(data: pd.DataFrame) -> list:
         """
         Calculates the fair price of stocks using Graham method
         """
 
-        graham_prices = []
-        for i in data.index.tolist():
-            a = data['LPA'][i]
-            b = data['VPA'][i]
-            c = 22.5 * a * b
-            if c < 0:
-                graham_prices.append(None)
-            elif a < 0:
-                graham_prices.append(None)
-            else:
-                value = math.sqrt(c)
-                graham_prices.append(value)
+        a = data['LPA']
+        c = 22.5 * a * data['VPA']
 
-        return graham_prices
+        return np.sqrt(c.where((c >= 0) & (a >= 0)))
 
-    def build_gordon_fair_price(self, data: pd.DataFrame) -> list:
-        return (1 / self.MARKET_RISK) * data['DPA'] * (1 + 0.01 * data['CAGR LUCROS 5 ANOS'])
+    @classmethod
+    def build_gordon_fair_price(cls, data: pd.DataFrame) -> list:
+        return (1 / cls.MARKET_RISK) * data['DPA'] * (1 + 0.01 * data['CAGR LUCROS 5 ANOS'])
 
-    def build_bazin_fair_price(self, data: pd.DataFrame) -> list:
+    @staticmethod
+    def build_bazin_fair_price(data: pd.DataFrame) -> list:
         return data['DPA'] / 0.06
 
     def build_greenbalt_rank(self, data: pd.DataFrame):
-        data_ebit_order = data.sort_values(by='EV/EBIT')
-        data_ebit_order['RANK EV/EBIT'] = [
-            pos for pos in range(data_ebit_order.shape[0])]
-        data['RANK EV/EBIT'] = data_ebit_order['RANK EV/EBIT']
-
-        data_order_roic = data.sort_values(by='ROIC', ascending=False)
-        data_order_roic['RANK ROIC'] = [
-            pos for pos in range(data_order_roic.shape[0])]
-        data['RANK ROIC'] = data_order_roic['RANK ROIC']
+        rank_ev_ebit, rank_roic, rank_greenblatt = self.greenblatt_rank(
+            ev_ebit=data['EV/EBIT'].to_numpy(dtype=float), roic=data['ROIC'].to_numpy(dtype=float))
 
-        data['PONTUACAO GREENBLATT'] = data['RANK EV/EBIT'] + data['RANK ROIC']
-
-        data_order_greenbalt = data.sort_values(by='PONTUACAO GREENBLATT')
-        data_order_greenbalt['RANK GREENBLATT'] = [
-            pos for pos in range(data_order_greenbalt.shape[0])]
-        data['RANK GREENBLATT'] = data_order_greenbalt['RANK GREENBLATT'].astype(int)
+        data['RANK EV/EBIT'] = rank_ev_ebit
+        data['RANK ROIC'] = rank_roic
+        data['PONTUACAO GREENBLATT'] = rank_ev_ebit + rank_roic
+        data['RANK GREENBLATT'] = rank_greenblatt
 
         self.__actualize_original_table_with_greenbalt_info(data=data)
 
         return data
 
+    @staticmethod
+    def greenblatt_rank(ev_ebit: np.ndarray, roic: np.ndarray) -> tuple:
+        """
+        Calculates the ranks of EV/EBIT (ascending), ROIC (descending) and the Greenblatt rank, which orders
+        the sum of both. Ties keep the original order and missing values are ranked last.
+        Returns the three arrays of ranks.
+        """
+
+        positions = np.arange(ev_ebit.shape[0])
+
+        rank_ev_ebit = np.empty_like(positions)
+        rank_ev_ebit[np.argsort(ev_ebit, kind="stable")] = positions
+
+        rank_roic = np.empty_like(positions)
+        rank_roic[np.argsort(-roic, kind="stable")] = positions
+
+        rank_greenblatt = np.empty_like(positions)
+        rank_greenblatt[np.argsort(rank_ev_ebit + rank_roic, kind="stable")] = positions
+
+        return rank_ev_ebit, rank_roic, rank_greenblatt
+
     def __actualize_original_table_with_greenbalt_info(self, data: pd.DataFrame):
         array_rank = list()
         for ticker in self.__stocks_table.index.tolist():
@@ -224,21 +283,24 @@ class StockInfoConstructor:
 
         self.__stocks_table['RANK GREENBLATT'] = array_rank
 
+    @classmethod
+    def build_valuations(cls, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Inserts the fair prices and discounts of Graham, Bazin and Gordon methods
+        """
+        data['PRECO JUSTO (GRAHAM)'] = cls.build_graham_fair_price(data=data)
+        data['DESCONTO (GRAHAM)'] = data['PRECO JUSTO (GRAHAM)'] / data['PRECO'] - 1
+
+        data['PRECO JUSTO (BAZIN)'] = cls.build_bazin_fair_price(data=data)
+        data['DESCONTO (BAZIN)'] = data['PRECO JUSTO (BAZIN)'] / data['PRECO'] - 1
+
+        data['PRECO JUSTO (GORDON)'] = cls.build_gordon_fair_price(data=data)
+        data['DESCONTO (GORDON)'] = data['PRECO JUSTO (GORDON)'] / data['PRECO'] - 1
+
+        return data
+
     def __construct_complete_info(self):
-        self.__stocks_table['PRECO JUSTO (GRAHAM)'] = self.build_graham_fair_price(
-            data=self.__stocks_table)
-        self.__stocks_table['DESCONTO (GRAHAM)'] = (
-                self.__stocks_table['PRECO JUSTO (GRAHAM)'] / self.__stocks_table['PRECO'] - 1)
-
-        self.__stocks_table['PRECO JUSTO (BAZIN)'] = self.build_bazin_fair_price(
-            data=self.__stocks_table)
-        self.__stocks_table['DESCONTO (BAZIN)'] = (
-                self.__stocks_table['PRECO JUSTO (BAZIN)'] / self.__stocks_table['PRECO'] - 1)
-
-        self.__stocks_table['PRECO JUSTO (GORDON)'] = self.build_gordon_fair_price(
-            data=self.__stocks_table)
-        self.__stocks_table['DESCONTO (GORDON)'] = (
-                self.__stocks_table['PRECO JUSTO (GORDON)'] / self.__stocks_table['PRECO'] - 1)
+        self.build_valuations(data=self.__stocks_table)
 
         self.__filtered_stocks_table = self.build_greenbalt_rank(
             data=self.__filtered_stocks_table)
@@ -0,0 +1,165 @@
+import os
+import tracemalloc
+from contextlib import closing
+from typing import Optional
+import numpy as np
+import pandas as pd
+from brfundamentus.constructor import ResquestBuilder, StockInfoConstructor
+
+
+class ChunkedStockInfoConstructor:
+    """
+    Class responsible to construct the complete table of stocks from very large exports, with bounded memory.
+    The export is parsed, treated and valued in batches of rows, and each batch is appended to a CSV file.
+    Only the columns needed for the Greenblatt rank are kept in memory, and the rank is added to the
+    output file in a second pass, also in batches.
+
+    Memory is measured with tracemalloc, so the peak is the memory allocated by Python and numpy during the run,
+    not the resident set size (RSS) of the process. Tracing slows down allocations, so it is only enabled
+    when a ceiling is set or 'track_memory' is True.
+    """
+
+    GREENBLATT_COLUMNS = ['EV/EBIT', 'ROIC']
+    SEPARATOR = ";"
+
+    def __init__(self, output_path: str, batch_size: int = 5000,
+                 max_memory_mb: Optional[float] = None,
+                 export_path: Optional[str] = None,
+                 track_memory: bool = False) -> None:
+        """
+        Parameters:
+            - output_path (string): Path of the CSV file with the complete table of stocks.
+            - batch_size (int): Number of rows processed at once. Default value is 5000.
+            - max_memory_mb (float): Memory ceiling, in megabytes. The peak of traced memory is checked after each batch,
+                                    and a MemoryError is raised if it exceeds the ceiling. Default is no ceiling.
+            - export_path (string): Path of a local export file. By default, the export is streamed from statusinvest.
+            - track_memory (bool): If True, the peak of traced memory is reported even without a ceiling.
+                                   Default value is False.
+        """
+
+        self.__output_path = output_path
+        self.__batch_size = batch_size
+        self.__max_memory_mb = max_memory_mb
+        self.__export_path = export_path
+        self.__track_memory = track_memory or max_memory_mb is not None
+        self.__excluded_companies = StockInfoConstructor.load_excluded_companies()
+        self.__peak_memory_mb: Optional[float] = None
+        self.__num_stocks = 0
+
+    @property
+    def output_path(self):
+        return self.__output_path
+
+    @property
+    def peak_memory_mb(self):
+        """
+        Peak of memory traced during the last run, in megabytes. None if memory was not tracked.
+        """
+        return self.__peak_memory_mb
+
+    @property
+    def num_stocks(self):
+        return self.__num_stocks
+
+    def run(self) -> str:
+        """
+        Runs the pipeline and returns the path of the output file.
+        The output file is only replaced if the whole pipeline succeeds.
+        """
+
+        self.__peak_memory_mb = None
+        already_tracing = tracemalloc.is_tracing()
+        if self.__track_memory:
+            if not already_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        partial_path = self.__output_path + ".partial"
+        ranked_path = self.__output_path + ".ranked"
+        try:
+            rows, ev_ebit, roic = self.__write_valued_batches(partial_path=partial_path)
+
+            ranks = np.full(self.__num_stocks, -1, dtype=np.int32)
+            ranks[rows] = StockInfoConstructor.greenblatt_rank(ev_ebit=ev_ebit, roic=roic)[2]
+
+            self.__write_ranked_batches(partial_path=partial_path, ranked_path=ranked_path, ranks=ranks)
+            os.replace(ranked_path, self.__output_path)
+        finally:
+            for path in (partial_path, ranked_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            if self.__track_memory:
+                self.__peak_memory_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                if not already_tracing:
+                    tracemalloc.stop()
+
+        return self.__output_path
+
+    def __write_valued_batches(self, partial_path: str) -> tuple:
+        """
+        First pass: treats and values each batch, writing it to 'partial_path'.
+        Returns the arrays of row positions, EV/EBIT and ROIC of the stocks of the filtered table.
+        """
+
+        self.__num_stocks = 0
+        rows, ev_ebit, roic = [], [], []
+
+        batches = ResquestBuilder.iter_batches(batch_size=self.__batch_size, path=self.__export_path)
+        with closing(batches):
+            for i, batch in enumerate(batches):
+                data = StockInfoConstructor.treat_original_data(original_data=batch)
+                StockInfoConstructor.build_valuations(data=data)
+
+                mask = StockInfoConstructor.filtered_mask(data=data, excluded_companies=self.__excluded_companies)
+                filtered = data.loc[mask, self.GREENBLATT_COLUMNS]
+                rows.append(self.__num_stocks + np.flatnonzero(mask.to_numpy()))
+                ev_ebit.append(filtered['EV/EBIT'].to_numpy(dtype=float))
+                roic.append(filtered['ROIC'].to_numpy(dtype=float))
+
+                data.to_csv(partial_path, sep=self.SEPARATOR, mode="w" if i == 0 else "a", header=i == 0)
+                self.__num_stocks += data.shape[0]
+
+                del batch, data, filtered
+                self.__check_memory()
+
+        if not rows:
+            return np.array([], dtype=int), np.array([]), np.array([])
+
+        return np.concatenate(rows), np.concatenate(ev_ebit), np.concatenate(roic)
+
+    def __write_ranked_batches(self, partial_path: str, ranked_path: str, ranks: np.ndarray):
+        """
+        Second pass: adds the Greenblatt rank to each batch of the partial file and writes it to 'ranked_path'.
+        Stocks out of the filtered table have rank -1.
+        """
+
+        if not os.path.exists(partial_path):
+            pd.DataFrame().to_csv(ranked_path, sep=self.SEPARATOR)
+            return
+
+        start = 0
+        with pd.read_csv(partial_path, sep=self.SEPARATOR, index_col=0, chunksize=self.__batch_size) as reader:
+            for i, data in enumerate(reader):
+                data['RANK GREENBLATT'] = ranks[start:start + data.shape[0]]
+                start += data.shape[0]
+                data.to_csv(ranked_path, sep=self.SEPARATOR, mode="w" if i == 0 else "a", header=i == 0)
+
+                del data
+                self.__check_memory()
+
+    def __check_memory(self):
+        if self.__max_memory_mb is None:
+            return
+
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        if peak_mb > self.__max_memory_mb:
+            raise MemoryError(f"Peak memory of {peak_mb:.1f} MB exceeds the ceiling of {self.__max_memory_mb} MB. "
+                              f"Try a smaller batch size than {self.__batch_size}")
+
+
+if __name__ == "__main__":
+    constructor = ChunkedStockInfoConstructor(output_path="stocks.csv", batch_size=1000, track_memory=True)
+    constructor.run()
+
+    print(f"{constructor.num_stocks} stocks written to {constructor.output_path}")
+    print(f"Peak memory: {constructor.peak_memory_mb:.1f} MB")
@@ -1,5 +1,6 @@
 from datetime import datetime
 from numpy import NaN
+from typing import Iterator, List, Optional
 import requests
 import pandas as pd
 
@@ -11,6 +12,19 @@ class ResquestBuilder():
 
     URL = "https://statusinvest.com.br/category/advancedsearchresultexport?search=%7B%22Sector%22%3A%22%22%2C%22SubSector%22%3A%22%22%2C%22Segment%22%3A%22%22%2C%22my_range%22%3A%22-20%3B100%22%2C%22forecast%22%3A%7B%22upsideDownside%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22estimatesNumber%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22revisedUp%22%3Atrue%2C%22revisedDown%22%3Atrue%2C%22consensus%22%3A%5B%5D%7D%2C%22dy%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22p_L%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22peg_Ratio%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22p_VP%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22p_Ativo%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22margemBruta%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22margemEbit%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22margemLiquida%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22p_Ebit%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22eV_Ebit%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22dividaLiquidaEbit%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22dividaliquidaPatrimonioLiquido%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22p_SR%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22p_CapitalGiro%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22p_AtivoCirculante%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22roe%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22roic%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22roa%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22liquidezCorrente%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22pl_Ativo%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22passivo_Ativo%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22giroAtivos%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22receitas_Cagr5%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22lucros_Cagr5%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22liquidezMediaDiaria%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22vpa%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22lpa%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%2C%22valorMercado%22%3A%7B%22Item1%22%3Anull%2C%22Item2%22%3Anull%7D%7D&CategoryType=1"
 
+    HEADERS = {
+        "Accept-Encoding": "gzip, deflate, br",
+        "Accept-Language": "pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3",
+        "Cache-Control": "max-age=0",
+        "Connection": "keep-alive",
+        "Host": "statusinvest.com.br",
+        "Referer": "https://www.google.com/",
+        "Sec-Fetch-Dest": "document",
+        "Sec-Fetch-Mode": "navigate",
+        "Sec-Fetch-Site": "cross-site",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0"
+    }
+
     def __init__(self):
         self.__request_time = datetime.now()
         self.__data = self.__build_data()
@@ -28,20 +42,7 @@ class ResquestBuilder():
         This method make the request from statusinvest and construct the initial datafrmame
         """
 
-        headers = {
-            "Accept-Encoding": "gzip, deflate, br",
-            "Accept-Language": "pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3",
-            "Cache-Control": "max-age=0",
-            "Connection": "keep-alive",
-            "Host": "statusinvest.com.br",
-            "Referer": "https://www.google.com/",
-            "Sec-Fetch-Dest": "document",
-            "Sec-Fetch-Mode": "navigate",
-            "Sec-Fetch-Site": "cross-site",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0"
-        }
-
-        response = requests.get(self.URL, headers=headers)
+        response = requests.get(self.URL, headers=self.HEADERS)
 
         data_as_string = response.text
 
@@ -49,21 +50,62 @@ class ResquestBuilder():
 
         key_names = lines[0].split(";")
 
-        data = []
-        for line in lines[1:-1]:
-            temp_info_split = line.split(";")
-            assert len(temp_info_split) == len(
-                key_names), f"{len(temp_info_split)}"
-
-            temp_dict = {key_names[i].strip(): self.__treat_info(
-                info) for i, info in enumerate(temp_info_split)}
-            data.append(temp_dict)
+        data = [self.__parse_line(line=line, key_names=key_names) for line in lines[1:-1]]
 
         dataframe = pd.DataFrame(data)
 
         return dataframe
 
-    def __treat_info(self, info: str):
+    @classmethod
+    def iter_batches(cls, batch_size: int = 5000, path: Optional[str] = None) -> Iterator[pd.DataFrame]:
+        """
+        This method streams the export and yields dataframes with at most 'batch_size' rows,
+        so the whole export is never held in memory. Close the generator if it is not consumed until the end,
+        so the connection or file is released.
+        If 'path' is given, the export is read from that local file instead of statusinvest.
+        """
+
+        if path is None:
+            with requests.get(cls.URL, headers=cls.HEADERS, stream=True) as response:
+                response.encoding = response.encoding or "utf-8"
+                yield from cls.__iter_batches_from_lines(lines=response.iter_lines(decode_unicode=True),
+                                                         batch_size=batch_size)
+        else:
+            with open(path, "r", encoding="utf-8") as file:
+                yield from cls.__iter_batches_from_lines(lines=(line.rstrip("\r\n") for line in file),
+                                                         batch_size=batch_size)
+
+    @classmethod
+    def __iter_batches_from_lines(cls, lines: Iterator[str], batch_size: int) -> Iterator[pd.DataFrame]:
+        header = next(lines, None)
+        if header is None:
+            return
+
+        key_names = header.split(";")
+
+        batch = []
+        for line in lines:
+            if not line:
+                continue
+            batch.append(cls.__parse_line(line=line, key_names=key_names))
+            if len(batch) == batch_size:
+                yield pd.DataFrame(batch)
+                batch = []
+
+        if batch:
+            yield pd.DataFrame(batch)
+
+    @classmethod
+    def __parse_line(cls, line: str, key_names: List[str]) -> dict:
+        temp_info_split = line.split(";")
+        assert len(temp_info_split) == len(
+            key_names), f"{len(temp_info_split)}"
+
+        return {key_names[i].strip(): cls.__treat_info(
+            info) for i, info in enumerate(temp_info_split)}
+
+    @staticmethod
+    def __treat_info(info: str):
         """
         This method treat a string. If possible, transform it into a float
         """
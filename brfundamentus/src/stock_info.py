@@ -1,17 +1,48 @@
 from brfundamentus.constructor import StockInfoConstructor
-from typing import List, Dict
+from typing import List, Dict, Callable
+from collections import OrderedDict
+import numpy as np
+import pickle
+import threading
 
 
 class StockInfo:
     """
-    This class is responsible for handle the fundamentalist info
+    This class is responsible for handle the fundamentalist info.
+    Results of the query methods are kept in a LRU cache, which is valid while the snapshot does not change.
     """
 
-    def __init__(self):
+    # Must be incremented whenever the attributes of the class change, so old saved snapshots are rejected
+    SNAPSHOT_VERSION = 3
+
+    SIMILARITY_INDICATORS = ['P/L', 'ROE', 'ROIC', 'MARGEM BRUTA', 'MARGEM EBIT', 'MARG. LIQUIDA',
+                             'DY', 'CAGR RECEITAS 5 ANOS', 'CAGR LUCROS 5 ANOS']
+
+    def __init__(self, cache_size: int = 128):
+        self.__cache_size = cache_size
+        self.__query_cache = OrderedDict()
+        self.__cache_lock = threading.Lock()
+        self.__similarity_index = dict()
+        self.__company_data = None
+        self.__cache_hits = 0
+        self.__cache_misses = 0
+        self.__load_snapshot()
+
+    def __load_snapshot(self):
         self.__constructor = StockInfoConstructor()
         self.__all_info = self.__constructor.dict_info
         self.__complete_data, self.__filtered_data = self.__constructor.get_stocks_complete_data()
         self.__all_parameters_keys = self.__complete_data.columns.tolist()
+        with self.__cache_lock:
+            self.__query_cache.clear()
+        self.__similarity_index.clear()
+        self.__company_data = None
+
+    def refresh(self):
+        """
+        Requests a new snapshot from the server. All cached query results are discarded.
+        """
+        self.__load_snapshot()
 
     @property
     def all_info(self):
@@ -29,10 +60,84 @@ class StockInfo:
     def all_tickers(self):
         return list(self.all_info.keys())
 
+    @property
+    def company_index(self) -> dict:
+        return self.__constructor.company_index
+
+    @property
+    def company_data(self):
+        """
+        Complete data with one row per company, keeping the most liquid share class
+        """
+        if self.__company_data is None:
+            liquidity = self.__complete_data['LIQUIDEZ MEDIA DIARIA']
+            most_liquid = liquidity.groupby(self.__constructor.ticker_company).idxmax()
+            self.__company_data = self.__complete_data.loc[most_liquid.tolist()]
+        return self.__company_data
+
     @property
     def request_time(self):
         return self.__constructor.request_time
 
+    @property
+    def cache_info(self) -> dict:
+        """
+        Statistics of the query results cache.
+        """
+        with self.__cache_lock:
+            return {"hits": self.__cache_hits,
+                    "misses": self.__cache_misses,
+                    "size": len(self.__query_cache),
+                    "max_size": self.__cache_size}
+
+    def clear_cache(self):
+        with self.__cache_lock:
+            self.__query_cache.clear()
+            self.__cache_hits = 0
+            self.__cache_misses = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_StockInfo__cache_lock']
+        state['_StockInfo__query_cache'] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__cache_lock = threading.Lock()
+
+    def __cached_query(self, key: tuple, query: Callable[[], List[Dict]]) -> List[Dict]:
+        """
+        Returns the result of 'query' from the cache, computing and storing it if needed.
+        The key always includes the snapshot version, so results from an old snapshot are never returned.
+        The cache is safe to be shared by many threads. The query itself runs outside the lock.
+        """
+
+        key = (self.request_time,) + key
+
+        with self.__cache_lock:
+            result = self.__query_cache.get(key)
+            if result is not None:
+                self.__cache_hits += 1
+                self.__query_cache.move_to_end(key)
+                return list(result)
+            self.__cache_misses += 1
+
+        result = tuple(query())
+
+        if self.__cache_size > 0:
+            with self.__cache_lock:
+                self.__query_cache[key] = result
+                self.__query_cache.move_to_end(key)
+                while len(self.__query_cache) > self.__cache_size:
+                    self.__query_cache.popitem(last=False)
+
+        return list(result)
+
+    @staticmethod
+    def __tickers_key(tickers: list) -> frozenset:
+        return frozenset(tickers) if tickers else frozenset()
+
     def __filter_stocks_by_single_criterion(self, parameter: str,
                                             cut_criterion: float = 0,
                                             reverse_cut: bool = False,
@@ -82,6 +187,22 @@ class StockInfo:
             - only_from (list): A list of tickers. Method will only consider stocks from that list before filter by given criterion.
         """
 
+        key = ("criterion", num_stocks, parameter, cut_criterion, reverse_cut, ascending,
+               self.__tickers_key(disconsider), self.__tickers_key(only_from))
+
+        return self.__cached_query(key, lambda: self.__top_stocks_by_criterion(num_stocks=num_stocks,
+                                                                              parameter=parameter,
+                                                                              cut_criterion=cut_criterion,
+                                                                              reverse_cut=reverse_cut,
+                                                                              ascending=ascending,
+                                                                              disconsider=disconsider,
+                                                                              only_from=only_from))
+
+    def __top_stocks_by_criterion(self, num_stocks: int, parameter: str,
+                                  cut_criterion: float, reverse_cut: bool,
+                                  ascending: bool, disconsider: list,
+                                  only_from: list) -> List[Dict]:
+
         info_list = self.__filter_stocks_by_single_criterion(parameter=parameter,
                                                              cut_criterion=cut_criterion,
                                                              reverse_cut=reverse_cut,
@@ -114,6 +235,21 @@ class StockInfo:
 
         """
 
+        conditionals_key = frozenset((criterion['parameter'], criterion['cut_criterion'], criterion['reverse_cut'])
+                                     for criterion in conditionals)
+        key = ("conditions", num_stocks, conditionals_key, sort_by['parameter'], sort_by['ascending'],
+               self.__tickers_key(disconsider), self.__tickers_key(only_from))
+
+        return self.__cached_query(key, lambda: self.__top_stocks_by_conditions(conditionals=conditionals,
+                                                                               sort_by=sort_by,
+                                                                               num_stocks=num_stocks,
+                                                                               disconsider=disconsider,
+                                                                               only_from=only_from))
+
+    def __top_stocks_by_conditions(self, conditionals: List[Dict], sort_by: dict,
+                                   num_stocks: int, disconsider: list,
+                                   only_from: list) -> List[Dict]:
+
         list_of_stocks_filtered = list()
         for criterion in conditionals:
             total_info = self.__filter_stocks_by_single_criterion(
@@ -172,6 +308,110 @@ class StockInfo:
                                                 disconsider=disconsider,
                                                 only_from=only_from)
 
+    def get_pareto_frontier(self, objectives: List[Dict], num_layers: int = 1,
+                            disconsider: list = None,
+                            only_from: list = None) -> List[Dict]:
+        """
+        This method selects the stocks which are not dominated by any other stock on a set of objectives.
+        Returns a list of dictionaries with all information of the selected stocks, plus the key 'FRONTEIRA'
+        with the number of the frontier layer of the stock (1 is the Pareto frontier).
+        The list is sorted by layer and then by the first objective.
+
+        Params:
+            - objectives: A list of dictionaries, each one containing information of one objective.
+                            Each dictionary must have the following keys:
+                                - 'parameter' (string): the parameter to optimize. Should be a key from the dictionary of all info.
+                                - 'maximize' (bool): flag to indicate if higher values are better.
+                            Stocks without value for some objective are not considered. For 'RANK' parameters,
+                            negative values (stocks without rank) are also not considered.
+            - num_layers (int): Number of successive frontier layers in the result. Default value is 1.
+            - disconsider (list): A list of tickers. All stocks with thoses tickers will be excluded in the final result.
+            - only_from (list): A list of tickers. Method will only consider stocks from that list.
+        """
+
+        objectives_key = tuple((objective['parameter'], objective['maximize']) for objective in objectives)
+        key = ("pareto", num_layers, objectives_key,
+               self.__tickers_key(disconsider), self.__tickers_key(only_from))
+
+        # The dictionaries are built for this query, so each call gets its own copies
+        result = self.__cached_query(key, lambda: self.__pareto_frontier(objectives=objectives,
+                                                                        num_layers=num_layers,
+                                                                        disconsider=disconsider,
+                                                                        only_from=only_from))
+
+        return [dict(info) for info in result]
+
+    def __pareto_frontier(self, objectives: List[Dict], num_layers: int,
+                          disconsider: list, only_from: list) -> List[Dict]:
+
+        parameters = [objective['parameter'] for objective in objectives]
+        if not parameters or num_layers <= 0 or any(p not in self.__all_parameters_keys for p in parameters):
+            return []
+
+        data = self.__complete_data[parameters].astype(float)
+        if disconsider:
+            data = data[~data.index.isin(disconsider)]
+        if only_from:
+            data = data[data.index.isin(only_from)]
+
+        for parameter in parameters:
+            if parameter[:4] == 'RANK':
+                data = data[data[parameter] >= 0]
+        data = data.dropna()
+
+        signs = np.array([-1 if objective['maximize'] else 1 for objective in objectives])
+        layers = self.__non_dominated_layers(data.to_numpy() * signs, num_layers=num_layers)
+
+        selected = [(layer, row) for row, layer in enumerate(layers) if layer > 0]
+        first_objective = data[parameters[0]].to_numpy() * signs[0]
+        selected.sort(key=lambda x: (x[0], first_objective[x[1]]))
+
+        tickers = data.index.tolist()
+        return [dict(self.all_info[tickers[row]], FRONTEIRA=int(layer)) for layer, row in selected]
+
+    @staticmethod
+    def __non_dominated_layers(values: np.ndarray, num_layers: int) -> np.ndarray:
+        """
+        Non-dominated sort of the rows of 'values', where lower values are better on every column.
+        Returns the frontier layer of each row, starting at 1. Rows beyond 'num_layers' get 0.
+        """
+
+        no_worse = (values[:, None, :] <= values[None, :, :]).all(axis=2)
+        better = (values[:, None, :] < values[None, :, :]).any(axis=2)
+        dominates = no_worse & better
+
+        dominators_count = dominates.sum(axis=0)
+        remaining = np.ones(values.shape[0], dtype=bool)
+        layers = np.zeros(values.shape[0], dtype=int)
+
+        for layer in range(1, num_layers + 1):
+            current = remaining & (dominators_count == 0)
+            if not current.any():
+                break
+            layers[current] = layer
+            remaining &= ~current
+            dominators_count -= dominates[current].sum(axis=0)
+
+        return layers
+
+    def unique_companies(self, list_of_stocks: List[Dict]) -> List[Dict]:
+        """
+        Removes from a list of stocks the share classes of companies already in the list.
+        Keeps the first occurrence of each company, so the order of the list is preserved.
+        """
+        ticker_company = self.__constructor.ticker_company
+
+        seen = set()
+        result = []
+        for info in list_of_stocks:
+            ticker = info['TICKER']
+            company = ticker_company.get(ticker) or self.__constructor.company_of(ticker)
+            if company not in seen:
+                seen.add(company)
+                result.append(info)
+
+        return result
+
     def get_ticker_info(self, ticker: str) -> dict:
         """
         Returns a dictionary with all information of the stock.
@@ -179,6 +419,114 @@ class StockInfo:
         """
         return self.all_info.get(ticker, None)
 
+    def __get_similarity_index(self, indicators: tuple) -> tuple:
+        """
+        Builds, once per snapshot, the standardized matrix of the given indicators over the complete data.
+        Missing and infinite values are ignored when standardizing and are marked in a mask of valid values.
+        """
+
+        if indicators not in self.__similarity_index:
+            values = self.__complete_data[list(indicators)].to_numpy(dtype=float)
+
+            mask = np.isfinite(values)
+            count = np.maximum(mask.sum(axis=0), 1)
+
+            mean = np.where(mask, values, 0).sum(axis=0) / count
+            deviation = np.where(mask, values - mean, 0)
+            std = np.sqrt((deviation ** 2).sum(axis=0) / count)
+            std[~(std > 0)] = 1
+
+            standardized = deviation / std
+
+            tickers = self.__complete_data.index.to_numpy()
+            positions = {ticker: i for i, ticker in enumerate(tickers)}
+
+            self.__similarity_index[indicators] = (tickers, positions, standardized, mask.astype(float))
+
+        return self.__similarity_index[indicators]
+
+    def similar_to_many(self, tickers: List[str], k: int = 5, indicators: List[str] = None) -> Dict[str, List[Dict]]:
+        """
+        Finds, for each ticker, the k stocks with the closest fundamentalist profile.
+        Returns a dictionary whose keys are the tickers and values are lists of dictionaries with all information
+        of the similar stocks, sorted by the key 'DISTANCIA'. Invalid tickers have an empty list.
+        Parameters:
+            - tickers (list): The tickers of the reference stocks.
+            - k (int): Maximum number of similar stocks for each ticker. Default value is 5.
+            - indicators (list): The parameters used to compare the stocks. Default value is SIMILARITY_INDICATORS.
+                                The distance is the root mean square of the standardized differences,
+                                considering only the parameters available for both stocks.
+        """
+
+        if indicators is None:
+            indicators = self.SIMILARITY_INDICATORS
+
+        result = {ticker: [] for ticker in tickers}
+
+        indicators = tuple(indicator for indicator in indicators if indicator in self.__all_parameters_keys)
+        if not indicators or k <= 0:
+            return result
+
+        all_tickers, positions, values, mask = self.__get_similarity_index(indicators)
+
+        valid_tickers = [ticker for ticker in result if ticker in positions]
+        if not valid_tickers:
+            return result
+
+        rows = np.array([positions[ticker] for ticker in valid_tickers])
+        query_values, query_mask = values[rows], mask[rows]
+
+        squared_sum = ((query_values ** 2) @ mask.T - 2 * query_values @ values.T
+                       + query_mask @ (values ** 2).T)
+        common_count = query_mask @ mask.T
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distances = np.sqrt(np.maximum(squared_sum, 0) / common_count)
+        distances[common_count == 0] = np.inf
+        distances[np.arange(len(rows)), rows] = np.inf
+
+        num_neighbours = min(k, len(all_tickers) - 1)
+        if num_neighbours <= 0:
+            return result
+
+        nearest = np.argpartition(distances, num_neighbours - 1, axis=1)[:, :num_neighbours]
+
+        for ticker, row_distances, row_nearest in zip(valid_tickers, distances, nearest):
+            row_nearest = row_nearest[np.argsort(row_distances[row_nearest])]
+            result[ticker] = [dict(self.all_info[all_tickers[j]], DISTANCIA=round(float(row_distances[j]), 4))
+                              for j in row_nearest if np.isfinite(row_distances[j])]
+
+        return result
+
+    def similar_to(self, ticker: str, k: int = 5, indicators: List[str] = None) -> List[Dict]:
+        """
+        Finds the k stocks with the closest fundamentalist profile to the given ticker.
+        See the docstring of method similar_to_many.
+        """
+        return self.similar_to_many(tickers=[ticker], k=k, indicators=indicators)[ticker]
+
+    def save(self, path: str):
+        """
+        Saves the current snapshot into a file, so it can be loaded later without a new request.
+        """
+        with open(path, "wb") as file:
+            pickle.dump({"version": self.SNAPSHOT_VERSION, "stock_info": self}, file)
+
+    @staticmethod
+    def load(path: str) -> "StockInfo":
+        """
+        Loads a snapshot previously saved with the method 'save'.
+        Raises ValueError if the file was not saved by this version of the class.
+        """
+        with open(path, "rb") as file:
+            content = pickle.load(file)
+
+        if not isinstance(content, dict) or content.get("version") != StockInfo.SNAPSHOT_VERSION \
+                or not isinstance(content.get("stock_info"), StockInfo):
+            raise ValueError(f"File {path} does not contain a compatible StockInfo snapshot")
+
+        return content["stock_info"]
+
 
 if __name__ == "__main__":
     ticker = "VALE3"
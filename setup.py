@@ -16,5 +16,10 @@ setuptools.setup(
     install_requires=required,
     packages=setuptools.find_packages(),
     include_package_data=True,
+    python_requires=">=3.9",
+    package_data={"brfundamentus": ["data/*.txt"]},
+    entry_points={
+        "console_scripts": ["brfundamentus-radar=brfundamentus.cli.radar:main"]
+    },
     description="A package to work with fundamental analysis of brazilian stocks"
 )